@@ -1,32 +1,142 @@
 import argparse
+import codecs
 import json
+import os
 import re
 import sys
-from datetime import date, timedelta
-from typing import Any, Dict, List, Optional
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; atomic replace still protects readers.
+    fcntl = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 BASE_URL = "https://maps.swindon.gov.uk/getdata.aspx"
+REQUEST_TIMEOUT = 15
+USER_AGENT = "Swindon-Rubbish-Days/1.0 (+https://github.com/M1XZG/Swindon-Rubbish-Days)"
 TAG_RE = re.compile(r"<[^>]+>")
+_HOUSE_NUM_CACHE: Dict[str, "re.Pattern[str]"] = {}
+CACHE_TTL = 24 * 60 * 60
+_CACHE_KEY_RE = re.compile(r"[^A-Za-z0-9_-]+")
+_CHARSET_RE = re.compile(r"charset=[\"']?([\w-]+)", re.IGNORECASE)
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)", re.IGNORECASE)
+
+
+class _TimeoutSession(requests.Session):
+    """Session that applies REQUEST_TIMEOUT unless a call passes its own."""
+
+    def request(self, method: str, url: str, *args: Any, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        return super().request(method, url, *args, **kwargs)
+
+
+def _build_session() -> requests.Session:
+    """Shared session so the search and waste lookups reuse one keep-alive connection."""
+    session = _TimeoutSession()
+    # Retry transient gateway errors on the pooled connection rather than failing the run.
+    retries = Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504], allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT, "Accept": "application/json"})
+    return session
+
+
+_SESSION = _build_session()
 
 
 def strip_tags(text: Any) -> Any:
     """Remove simple HTML tags (e.g., <b>postcode</b>) from API strings."""
-    if isinstance(text, str):
+    if isinstance(text, str) and "<" in text:
         return TAG_RE.sub("", text)
     return text
 
 
-def _safe_json(response: requests.Response) -> Any:
-    """Parse JSON even when server sends the wrong content-type."""
+def _cache_dir() -> Path:
+    return Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser() / "swindon-rubbish"
+
+
+def _cache_path(key: str) -> Path:
+    return _cache_dir() / f"{_CACHE_KEY_RE.sub('_', key)}.json"
+
+
+def _cache_read(key: str) -> Optional[Dict[str, Any]]:
+    """Return the raw cache entry for key, however old, or None if missing or unreadable."""
     try:
-        return response.json()
-    except ValueError:
-        return json.loads(response.text)
+        with _cache_path(key).open(encoding="utf-8") as fh:
+            entry = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    return entry if isinstance(entry, dict) and "data" in entry else None
+
+
+def _cache_fresh(entry: Dict[str, Any], ttl: float = CACHE_TTL) -> bool:
+    """An entry's own ttl (from a server max-age longer than the default) takes precedence."""
+    try:
+        return time.time() - float(entry["ts"]) <= float(entry.get("ttl", ttl))
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def _cache_get(key: str, ttl: float = CACHE_TTL) -> Optional[Any]:
+    """Return cached data for key if it is still fresh."""
+    entry = _cache_read(key)
+    if entry is None or not _cache_fresh(entry, ttl):
+        return None
+    return entry["data"]
 
 
-def search_locations(query: str, page_size: int = 150) -> List[Dict[str, Any]]:
+def _cache_put(key: str, value: Any, **meta: Any) -> None:
+    """Atomically write value to the cache; failures are ignored since the cache is best-effort."""
+    path = _cache_path(key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # One lock for the whole directory; per-key lock files would never get cleaned up.
+        with open(path.parent / ".lock", "w", encoding="utf-8") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                    json.dump({"ts": time.time(), "data": value, **meta}, fh)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+    except OSError:
+        pass
+
+
+def _safe_json(response: requests.Response) -> Any:
+    """Parse JSON straight from the body bytes, whatever content-type the server sends."""
+    charset = _CHARSET_RE.search(response.headers.get("Content-Type", ""))
+    if charset and charset.group(1).lower().replace("_", "-") not in ("utf-8", "utf8"):
+        # Only a declared non-UTF-8 charset needs requests' text decoding.
+        body = response.text.encode("utf-8")
+    else:
+        body = response.content
+    if body.startswith(codecs.BOM_UTF8):
+        body = body[len(codecs.BOM_UTF8):]
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def _fetch_locations(query: str, page_size: int) -> Dict[str, Any]:
     params = {
         "type": "json",
         "service": "LocationSearch",
@@ -36,15 +146,29 @@ def search_locations(query: str, page_size: int = 150) -> List[Dict[str, Any]]:
         "startnum": 1,
         "mapsource": "mapsources/LocalInfoLookup",
     }
-    resp = requests.get(BASE_URL, params=params, timeout=15)
+    resp = _SESSION.get(BASE_URL, params=params)
     resp.raise_for_status()
-    payload = _safe_json(resp)
+    return _safe_json(resp)
+
+
+def search_locations(
+    query: str, page_size: int = 150, use_cache: bool = True, refresh: bool = False
+) -> List[Dict[str, Any]]:
+    cache_key = f"search-{query.replace(' ', '').upper()}-{page_size}"
+    payload = _cache_get(cache_key) if use_cache and not refresh else None
+    if payload is None:
+        payload = _fetch_locations(query, page_size)
+        # Don't pin a typo'd postcode or a transient empty reply for a whole TTL.
+        if use_cache and payload.get("data"):
+            _cache_put(cache_key, payload)
     columns = payload.get("columns", [])
     data_rows = payload.get("data", [])
+    tagged_keys = [key for key in ("DisplayName", "Name") if key in columns]
     addresses: List[Dict[str, Any]] = []
     for row in data_rows:
-        item = {col: row[idx] for idx, col in enumerate(columns) if idx < len(row)}
-        for key in ("DisplayName", "Name"):
+        # zip stops at the shorter side, so ragged rows simply omit trailing columns.
+        item = dict(zip(columns, row))
+        for key in tagged_keys:
             if key in item:
                 item[key] = strip_tags(item[key])
         addresses.append(item)
@@ -55,7 +179,10 @@ def select_address(addresses: List[Dict[str, Any]], house_number: Optional[str])
     if not addresses:
         return None
     if house_number:
-        pattern = re.compile(rf"\b{re.escape(str(house_number))}\b", re.IGNORECASE)
+        key = str(house_number)
+        pattern = _HOUSE_NUM_CACHE.get(key)
+        if pattern is None:
+            pattern = _HOUSE_NUM_CACHE.setdefault(key, re.compile(rf"\b{re.escape(key)}\b", re.IGNORECASE))
         filtered = [addr for addr in addresses if pattern.search(str(addr.get("DisplayName", "")))]
         if filtered:
             return filtered[0]
@@ -63,6 +190,8 @@ def select_address(addresses: List[Dict[str, Any]], house_number: Optional[str])
 
 
 WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_WEEKDAY_IDX = {day: idx for idx, day in enumerate(WEEKDAYS)}
+_ALT_KEYS = ("collectday", "collectionroute", "CollectionDay", "collectionday")
 MONTHS = {
     "january": 1,
     "february": 2,
@@ -96,30 +225,97 @@ DATE_PATTERN = re.compile(
 )
 
 
-def _parse_explicit_date(text: str) -> Optional[date]:
-    if not text:
-        return None
-    match = DATE_PATTERN.search(text)
+def _parse_day_and_date(text: str) -> Tuple[Optional[str], Optional[date]]:
+    """Scan text once, returning the weekday named alongside an explicit date and the date itself."""
+    match = DATE_PATTERN.search(text) if text else None
     if not match:
-        return None
+        return None, None
+    dayname = match.group("dayname")
+    day_name = dayname.title() if dayname else None
     day = int(match.group("day"))
     month = MONTHS.get(match.group("month").lower())
     year = int(match.group("year"))
     try:
-        return date(year, month, day)
+        return day_name, date(year, month, day)
     except ValueError:
-        return None
+        return day_name, None
 
 
-def _next_date_for_day(day_name: str, today: date) -> date:
-    target = WEEKDAYS.index(day_name.lower())
-    current = today.weekday()
-    delta = (target - current) % 7
-    # If today is the day, keep today; otherwise move forward.
-    return today + timedelta(days=delta)
+def _parse_explicit_date(text: str) -> Optional[date]:
+    return _parse_day_and_date(text)[1]
 
 
-def fetch_waste_info(uprn: str) -> List[Any]:
+def _scan_message(text: str) -> Tuple[Optional[str], Optional[date]]:
+    """Weekday and date for a message; a weekday named with the explicit date wins.
+
+    So "Tuesday, 14 October 2025 (moved from Monday)" reports Tuesday, the day that
+    matches the date, rather than the first weekday mentioned anywhere in the text.
+    """
+    day, next_date = _parse_day_and_date(text)
+    if not day:
+        day = _extract_weekday(text)
+    return day, next_date
+
+
+def _next_date_core(target_idx: int, today_ordinal: int) -> int:
+    """Ordinal of the next date (today included) falling on weekday target_idx."""
+    # date.toordinal() is 1 for Monday 0001-01-01, so (ordinal - 1) % 7 is the weekday.
+    return today_ordinal + (target_idx - (today_ordinal - 1)) % 7
+
+
+def _next_date_for_day(day_name: str, today: date) -> date:
+    target = _WEEKDAY_IDX.get(day_name.lower())
+    if target is None:
+        raise ValueError(f"Unknown weekday: {day_name!r}")
+    today_ordinal = today.toordinal()
+    next_ordinal = _next_date_core(target, today_ordinal)
+    # If today is the day, keep today rather than building an equal date.
+    return date.fromordinal(next_ordinal) if next_ordinal != today_ordinal else today
+
+
+def fetch_waste_info(uprn: str, use_cache: bool = True, refresh: bool = False) -> List[Any]:
+    cache_key = f"waste-{uprn}"
+    entry = _cache_read(cache_key) if use_cache else None
+    if entry is not None and not refresh and _cache_fresh(entry):
+        return entry["data"]
+
+    # Revalidate a stale entry so an unchanged schedule comes back as a bodiless 304.
+    headers: Dict[str, str] = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    resp = _fetch_waste_info(uprn, headers)
+    previous: Dict[str, Any] = {}
+    if resp.status_code == 304 and entry is not None:
+        # A 304 only refreshes the headers it carries; everything else stays as stored.
+        previous = entry
+        data = entry["data"]
+    else:
+        resp.raise_for_status()
+        data = _safe_json(resp)
+
+    # Cache-Control is advisory for this private, single-user cache: no-store is honoured,
+    # no-cache is ignored (--refresh forces revalidation), and max-age may only extend CACHE_TTL.
+    cache_control = resp.headers.get("Cache-Control", "")
+    directives = {part.strip().split("=", 1)[0].lower() for part in cache_control.split(",")}
+    # As in search_locations, don't pin a typo'd UPRN or an empty reply for a whole TTL.
+    cacheable = bool(data) and bool(parse_collections(data))
+    if use_cache and cacheable and "no-store" not in directives:
+        meta: Dict[str, Any] = {
+            "etag": resp.headers.get("ETag") or previous.get("etag"),
+            "last_modified": resp.headers.get("Last-Modified") or previous.get("last_modified"),
+            "ttl": previous.get("ttl"),
+        }
+        max_age = _MAX_AGE_RE.search(cache_control)
+        if max_age and int(max_age.group(1)) > CACHE_TTL:
+            meta["ttl"] = int(max_age.group(1))
+        _cache_put(cache_key, data, **{k: v for k, v in meta.items() if v is not None})
+    return data
+
+
+def _fetch_waste_info(uprn: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
     params = {
         "RequestType": "LocalInfo",
         "ms": "mapsources/LocalInfoLookup",
@@ -127,9 +323,7 @@ def fetch_waste_info(uprn: str) -> List[Any]:
         "uid": uprn,
         "format": "json",
     }
-    resp = requests.get(BASE_URL, params=params, timeout=15)
-    resp.raise_for_status()
-    return _safe_json(resp)
+    return _SESSION.get(BASE_URL, params=params, headers=headers)
 
 
 def parse_collections(items: List[Any], today: Optional[date] = None) -> List[Dict[str, Optional[str]]]:
@@ -144,24 +338,28 @@ def parse_collections(items: List[Any], today: Optional[date] = None) -> List[Di
             next_date: Optional[date] = None
 
             if isinstance(details, dict):
-                message = details.get("_") if isinstance(details.get("_"), str) else None
+                get = details.get
+                message = get("_")
+                if not isinstance(message, str):
+                    message = None
                 if message:
-                    day = _extract_weekday(message)
-                    next_date = _parse_explicit_date(message)
+                    day, next_date = _scan_message(message)
 
-                for alt_key in ("collectday", "collectionroute", "CollectionDay", "collectionday"):
-                    alt_value = details.get(alt_key)
-                    if isinstance(alt_value, str) and not day:
+                for alt_key in _ALT_KEYS:
+                    alt_value = get(alt_key)
+                    if not isinstance(alt_value, str):
+                        continue
+                    if not day:
                         day = alt_value
-                    if isinstance(alt_value, str) and not next_date:
+                    if not next_date:
                         next_date = _parse_explicit_date(alt_value)
-                if not message and isinstance(details.get("Info"), str):
-                    message = details["Info"]
+                info = get("Info")
+                if not message and isinstance(info, str):
+                    message = info
                     next_date = next_date or _parse_explicit_date(message)
             elif isinstance(details, str):
                 message = details
-                day = _extract_weekday(details)
-                next_date = _parse_explicit_date(details)
+                day, next_date = _scan_message(details)
 
             if day or message:
                 if not next_date and day:
@@ -207,10 +405,21 @@ def main(argv: Optional[List[str]] = None) -> int:
     parser = argparse.ArgumentParser(description="Lookup Swindon rubbish collection days")
     parser.add_argument("--postcode", required=True, help="Postcode to search (e.g. SN1 2JG)")
     parser.add_argument("--house-number", help="House number to match within the postcode")
+    parser.add_argument("--uprn", help="Known UPRN; fetches collections while the postcode search runs")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the local response cache")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached responses and fetch fresh data")
     args = parser.parse_args(argv)
 
+    with _SESSION:
+        return _run(args)
+
+
+def _run(args: argparse.Namespace) -> int:
+    if args.uprn:
+        return _run_with_uprn(args)
+
     try:
-        addresses = search_locations(args.postcode)
+        addresses = search_locations(args.postcode, use_cache=not args.no_cache, refresh=args.refresh)
     except Exception as exc:  # pylint: disable=broad-except
         print(f"Failed to search postcode: {exc}", file=sys.stderr)
         return 1
@@ -222,7 +431,7 @@ def main(argv: Optional[List[str]] = None) -> int:
 
     uprn = str(chosen.get("UniqueId"))
     try:
-        raw_collections = fetch_waste_info(uprn)
+        raw_collections = fetch_waste_info(uprn, use_cache=not args.no_cache, refresh=args.refresh)
     except Exception as exc:  # pylint: disable=broad-except
         print(f"Failed to fetch collection info: {exc}", file=sys.stderr)
         return 1
@@ -233,5 +442,32 @@ def main(argv: Optional[List[str]] = None) -> int:
     return 0
 
 
+def _run_with_uprn(args: argparse.Namespace) -> int:
+    """The UPRN is already known, so the waste lookup need not wait for the address search."""
+    cache_opts = {"use_cache": not args.no_cache, "refresh": args.refresh}
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        waste_future = pool.submit(fetch_waste_info, args.uprn, **cache_opts)
+        search_future = pool.submit(search_locations, args.postcode, **cache_opts)
+        try:
+            raw_collections = waste_future.result()
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"Failed to fetch collection info: {exc}", file=sys.stderr)
+            return 1
+        try:
+            addresses = search_future.result()
+        except Exception:  # pylint: disable=broad-except
+            # The address is only used for display, so fall back to the bare UPRN.
+            addresses = []
+
+    chosen = next((addr for addr in addresses if str(addr.get("UniqueId")) == args.uprn), None)
+    if not chosen:
+        chosen = {"UniqueId": args.uprn}
+
+    collections = parse_collections(raw_collections)
+    output = format_output(chosen, collections)
+    print(output)
+    return 0
+
+
 if __name__ == "__main__":
     sys.exit(main())
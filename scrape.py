@@ -1,19 +1,37 @@
 import argparse
+import os
 import re
+import sys
+from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-from playwright.sync_api import Playwright, sync_playwright
+from main import DATE_PATTERN, fetch_waste_info, parse_collections, search_locations, select_address
 
 PAGE_URL = "https://www.swindon.gov.uk/info/20122/rubbish_and_recycling_collection_days"
 DATE_RE = re.compile(
     r"(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\s*,?\s*\d{1,2}\s+[a-z]+\s+\d{4}",
     re.IGNORECASE,
 )
+_POSTCODE_RE = re.compile("postcode", re.IGNORECASE)
+_SEARCH_RE = re.compile("search", re.IGNORECASE)
+_ACCEPT_ANY_RE = re.compile("accept", re.IGNORECASE)
+_ACCEPT_RES = [
+    re.compile(text, re.IGNORECASE)
+    for text in ("Accept Recommended Settings", "Accept all", "Accept")
+]
+
+
+def _profile_dir() -> Path:
+    """Browser profile kept between runs so the cookie consent is remembered."""
+    return Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser() / "swindon-rubbish" / "pw"
 
 
 def accept_cookies(page) -> None:
-    for text in ["Accept Recommended Settings", "Accept all", "Accept"]:
-        btn = page.get_by_role("button", name=re.compile(text, re.IGNORECASE))
+    # With a persisted profile the banner is usually gone; one query saves trying each label.
+    if page.get_by_role("button", name=_ACCEPT_ANY_RE).count() == 0:
+        return
+    for pattern in _ACCEPT_RES:
+        btn = page.get_by_role("button", name=pattern)
         if btn.count() and btn.first.is_visible():
             btn.first.click()
             break
@@ -22,9 +40,9 @@ def accept_cookies(page) -> None:
 def fill_postcode(page, postcode: str) -> None:
     page.wait_for_timeout(500)
     locators = [
-        page.get_by_label(re.compile("postcode", re.IGNORECASE)),
-        page.get_by_placeholder(re.compile("postcode", re.IGNORECASE)),
-        page.get_by_role("textbox", name=re.compile("postcode", re.IGNORECASE)),
+        page.get_by_label(_POSTCODE_RE),
+        page.get_by_placeholder(_POSTCODE_RE),
+        page.get_by_role("textbox", name=_POSTCODE_RE),
         page.locator("input[name=postcode]"),
         page.locator("input[id*=postcode]"),
         page.locator("input[type=search]"),
@@ -43,7 +61,7 @@ def fill_postcode(page, postcode: str) -> None:
     if not box:
         raise RuntimeError("Could not find postcode input (try --headful to see the page)")
     box.fill(postcode)
-    search_button = page.get_by_role("button", name=re.compile("search", re.IGNORECASE))
+    search_button = page.get_by_role("button", name=_SEARCH_RE)
     if search_button.count():
         search_button.first.click()
     else:
@@ -61,13 +79,17 @@ def pick_address(page, house_number: Optional[str]) -> None:
         select = page.locator("select")
     if select.count() == 0:
         return
-    options = select.first.evaluate("(el) => Array.from(el.options).map(o => ({value:o.value,text:o.textContent}))")
-    choice = options[0]["value"] if options else None
-    if house_number:
-        for opt in options:
-            if str(house_number) in (opt.get("text") or ""):
-                choice = opt["value"]
-                break
+    # Match in the page so only the chosen value crosses back from the browser.
+    choice = select.first.evaluate(
+        r"""(el, hn) => {
+          const opts = Array.from(el.options);
+          const esc = hn ? hn.replace(/[.*+?^${}()|[\]\\]/g, '\\$&') : null;
+          const re = esc ? new RegExp('\\b' + esc + '\\b', 'i') : null;
+          const m = re ? opts.find(o => re.test(o.textContent || '')) : null;
+          return (m || opts[0] || {}).value || null;
+        }""",
+        str(house_number) if house_number else None,
+    )
     if choice:
         select.first.select_option(value=choice)
 
@@ -75,13 +97,15 @@ def pick_address(page, house_number: Optional[str]) -> None:
 def extract_collections(page) -> List[Dict[str, Any]]:
     script = """
     const dateRe = /(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\s*,?\s*\d{1,2}\s+[a-z]+\s+\d{4}/i;
-    const matches = [];
-    document.querySelectorAll('strong, b').forEach(el => {
-      const txt = (el.textContent || '').trim();
-      if (!dateRe.test(txt)) return;
+    // Each ancestor's resolved title is cached, so shared ancestors are only searched once.
+    const titles = new Map();
+    const titleFor = (start) => {
+      const path = [];
       let title = null;
-      let node = el;
+      let node = start;
       while (node) {
+        if (titles.has(node)) { title = titles.get(node); break; }
+        path.push(node);
         const h3 = node.querySelector ? node.querySelector('h3') : null;
         if (h3 && h3.textContent.trim()) { title = h3.textContent.trim(); break; }
         if (node.previousElementSibling) {
@@ -90,6 +114,14 @@ def extract_collections(page) -> List[Dict[str, Any]]:
         }
         node = node.parentElement;
       }
+      path.forEach(n => titles.set(n, title));
+      return title;
+    };
+    const matches = [];
+    document.querySelectorAll('strong, b').forEach(el => {
+      const txt = (el.textContent || '').trim();
+      if (!dateRe.test(txt)) return;
+      let title = titleFor(el);
       if (!title) {
         const nearest = el.closest('section, article, div');
         const h3 = nearest ? nearest.querySelector('h3') : null;
@@ -102,30 +134,74 @@ def extract_collections(page) -> List[Dict[str, Any]]:
     return page.evaluate(script)
 
 
-def scrape(postcode: str, house_number: Optional[str], headless: bool = True) -> List[Dict[str, Any]]:
+def scrape_http(postcode: str, house_number: Optional[str]) -> List[Dict[str, Any]]:
+    """Fetch dates from the iShare JSON endpoint main.py uses, without a browser.
+
+    Only returns results when every service's message carries an explicit date, in the
+    same "Friday 17 October 2025" form the page shows. Dates derived from a bare weekday
+    ignore fortnightly rotation, so anything less means the browser is needed.
+    """
+    chosen = select_address(search_locations(postcode), house_number)
+    if not chosen:
+        return []
+    raw = fetch_waste_info(str(chosen.get("UniqueId")))
+    results: List[Dict[str, Any]] = []
+    for entry in parse_collections(raw):
+        match = DATE_PATTERN.search(entry["message"] or "")
+        if not match or not match.group("dayname"):
+            return []
+        results.append({"title": entry["service"], "date": match.group(0).strip()})
+    return results
+
+
+def scrape(
+    postcode: str, house_number: Optional[str], headless: bool = True, force_browser: bool = False
+) -> List[Dict[str, Any]]:
+    if not force_browser:
+        try:
+            data = scrape_http(postcode, house_number)
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"HTTP lookup failed ({exc}); falling back to the browser", file=sys.stderr)
+        else:
+            if data:
+                return data
+            print("HTTP lookup found no dated schedule; falling back to the browser", file=sys.stderr)
+    return scrape_browser(postcode, house_number, headless=headless)
+
+
+def scrape_browser(postcode: str, house_number: Optional[str], headless: bool = True) -> List[Dict[str, Any]]:
+    # Imported lazily so the HTTP path works without Playwright installed.
+    from playwright.sync_api import sync_playwright
+
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=headless)
-        context = browser.new_context()
-        page = context.new_page()
+        context = p.chromium.launch_persistent_context(user_data_dir=str(_profile_dir()), headless=headless)
+        page = context.pages[0] if context.pages else context.new_page()
         page.goto(PAGE_URL, wait_until="networkidle")
         accept_cookies(page)
         fill_postcode(page, postcode)
-        page.wait_for_timeout(2500)
+        try:
+            page.wait_for_selector("select option", state="attached", timeout=10_000)
+        except Exception:
+            pass  # pick_address copes with pages that show no address list
         pick_address(page, house_number)
-        page.wait_for_timeout(3000)
+        try:
+            page.get_by_text(DATE_RE).first.wait_for(timeout=10_000)
+        except Exception:
+            pass
         data = extract_collections(page)
-        browser.close()
+        context.close()
         return data
 
 
 def main(argv: Optional[List[str]] = None) -> int:
-    parser = argparse.ArgumentParser(description="Scrape Swindon collection dates via Playwright")
+    parser = argparse.ArgumentParser(description="Scrape Swindon collection dates (HTTP first, Playwright fallback)")
     parser.add_argument("--postcode", required=True, help="Postcode, e.g. SN2 7TN")
     parser.add_argument("--house-number", help="House number")
     parser.add_argument("--headful", action="store_true", help="Run browser non-headless for debugging")
+    parser.add_argument("--force-browser", action="store_true", help="Skip the HTTP lookup and always use Playwright")
     args = parser.parse_args(argv)
 
-    results = scrape(args.postcode, args.house_number, headless=not args.headful)
+    results = scrape(args.postcode, args.house_number, headless=not args.headful, force_browser=args.force_browser)
     if not results:
         print("No dates found.")
         return 1